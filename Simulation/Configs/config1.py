@@ -21,4 +21,6 @@ MONTH_LENGTH_DAYS = 30
 SIMULATION_DURATION = 30
 TIMESTEP = 60  #En minutos
 SEASON = "winter" # "spring" | "summer" | "autumn" | "winter"
-MANAGEMENT_STRATEGY = "charge_priority" # "load_priority" | "charge_priority" | "produce_priority"
\ No newline at end of file
+MANAGEMENT_STRATEGY = "charge_priority" # "load_priority" | "charge_priority" | "produce_priority"
+OUTPUT_FORMAT = "parquet" # "parquet" | "csv"
+PROFILE = False # True prints time spent per simulation section
\ No newline at end of file
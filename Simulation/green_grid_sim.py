@@ -1,9 +1,13 @@
 import os
-import csv
-import random
-import simpy
 import math
-from solar_model import sample_cloud_coverage, solar_generation_kw
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from numba import njit
+from solar_model import MINUTES_PER_DAY, sample_cloud_coverage_array, solar_generation_kw_vec
 from Configs import config1 as config
 
 # --------- Helper / Parameters (tune via Configs/config.py) ---------
@@ -12,6 +16,9 @@ ROUND_TRIP = getattr(config, "ROUND_TRIP_EFFICIENCY", 0.9)
 BATTERY_MIN_SOC_FRAC = getattr(config, "BATTERY_MIN_SOC_FRACTION", 0.05)
 
 INVERTER_MAX_KW = getattr(config, "MAX_INVERTER_OUTPUT", 4.0)
+
+BASE_LOAD = getattr(config, "BASE_LOAD", 0.9)
+PEAK_LOAD = getattr(config, "PEAK_LOAD", 3.5)
 TIMESTEP_MIN = getattr(config, "TIMESTEP", 30)
 SIM_TOTAL_DAY = getattr(config, "SIMULATION_DURATION", 1)
 MONTH_LENGTH_DAYS = getattr(config, "MONTH_LENGTH_DAYS", 30)
@@ -27,41 +34,214 @@ MANAGEMENT_STRATEGY = getattr(config, "MANAGEMENT_STRATEGY", "load_priority")
 
 
 OUTPUT_DIR = "output"
-OUTPUT_CSV = os.path.join(OUTPUT_DIR, "log.csv")
-EVENTS_CSV = os.path.join(OUTPUT_DIR, "events.csv")
+OUTPUT_FORMAT = getattr(config, "OUTPUT_FORMAT", "parquet")  # "parquet" | "csv"
+
+# time spent per section of the simulation, printed after the run
+PROFILE = getattr(config, "PROFILE", False)
+PROFILE_SECTIONS = ("rng", "daily", "solar", "load", "core", "events", "columns", "write")
 
 ETA_CHARGE = math.sqrt(ROUND_TRIP)
 ETA_DISCHARGE = math.sqrt(ROUND_TRIP)
 
+# derived once instead of per step
+BATTERY_MIN_SOC_KWH = BATTERY_CAP_KWH * BATTERY_MIN_SOC_FRAC
+BATTERY_FULL_KWH = BATTERY_CAP_KWH * 0.99       # "BATTERY FULL" / charge_priority threshold
+BATTERY_LOW_KWH = BATTERY_MIN_SOC_KWH * 1.01    # "BATTERY LOW" threshold
+INV_ETA_CHARGE = 1.0 / ETA_CHARGE
+
 
 # --------- Simple demand model ---------
-def sample_load_kw(env_now_min):
-    hour = int((env_now_min // 60) % 24)
-    load = getattr(config, "BASE_LOAD", 0.9)
-    
+def sample_load_kw(t_min, spike_mask, spike_amp, noise):
+    """Load in kW for an array of times (minutes); spike_mask/spike_amp/noise are pre-drawn per step."""
+    hour = (t_min // 60) % 24
+    load = np.full(hour.shape, BASE_LOAD)
+
     # morning bump
-    if 7 <= hour < 9:
-        load += 0.6
+    load += 0.6 * ((hour >= 7) & (hour < 9))
     # evening peak
-    if 18 <= hour < 21:
-        load += 0.8
+    load += 0.8 * ((hour >= 18) & (hour < 21))
     # random spike occasionally
-    if random.random() < 0.05:
-        load += random.uniform(0.0, getattr(config, "PEAK_LOAD", 3.5))
-    load += random.uniform(-0.1, 0.2)
-    return max(0.0, load)
+    load += spike_mask * spike_amp
+    load += noise
+    return np.maximum(load, 0.0)
+
+# --------- Log layout (one preallocated array per column) ---------
+# float32 is plenty for kW/kWh/SoC and halves memory traffic and file size;
+# running state (SoC, monthly export, totals) is kept in float64.
+LOG_CHUNK_DAYS = getattr(config, "LOG_CHUNK_DAYS", 30)
+
+LOG_COLUMNS = {
+    "time_min": np.int32,
+    "hour": np.int32,
+    "solar_kw": np.float32,
+    "load_kw": np.float32,
+    "energy_gen_kwh": np.float32,
+    "energy_load_kwh": np.float32,
+    "net_kwh": np.float32,
+    "battery_soc_kwh": np.float32,
+    "battery_soc_pct": np.float32,
+    "battery_charged_kwh": np.float32,
+    "battery_discharged_kwh": np.float32,
+    "grid_import_kwh": np.float32,
+    "grid_export_kwh": np.float32,
+    "curtailed_kwh": np.float32,
+    "unmet_load_kwh": np.float32,
+    "inverter_ok": np.bool_,
+    "cloud": np.float32,
+    "strategy": object,
+    "import_cost": np.float32,
+    "export_revenue": np.float32,
+    "net_cost": np.float32,
+    "month_exported_kwh": np.float32,
+}
+TOTAL_COLUMNS = ("energy_gen_kwh", "energy_load_kwh", "grid_import_kwh", "grid_export_kwh",
+                 "curtailed_kwh", "import_cost", "export_revenue")
+EVENT_FIELDS = ("time_min", "hour", "event_type", "description")
+
+
+
+# --------- Battery SoC core ---------
+LOAD_PRIORITY = 0
+CHARGE_PRIORITY = 1
+PRODUCE_PRIORITY = 2
+STRATEGY_IDS = {
+    "load_priority": LOAD_PRIORITY,
+    "charge_priority": CHARGE_PRIORITY,
+    "produce_priority": PRODUCE_PRIORITY,
+}
+
+
+@njit(cache=True)
+def _simulate_core(net_kwh, steps_per_day, month_start, cap, full_kwh, min_soc_kwh,
+                   eta_c, inv_eta_c, eta_d, export_step_kwh, monthly_cap_kwh, strategy_id,
+                   start_soc, start_month_exported,
+                   soc, grid_import_kwh, grid_export_kwh, unmet_load_kwh,
+                   battery_charged_kwh, battery_discharged_kwh, curtailed_kwh,
+                   month_exported, export_blocked):
+    """
+    Battery SoC recurrence over the whole horizon, compiled with Numba.
+    Runs day by day (month_start is per day) and fills the per-step output
+    arrays in place; every element is written. State is carried in float64
+    whatever the array dtype; returns the final (soc, month_exported_kwh).
+    Per-step constants (full threshold, 1/eta_c, export cap per step) come in
+    precomputed so the loop body has no divisions by them.
+    """
+    battery_soc = start_soc
+    month_exported_kwh = start_month_exported
+
+    n = net_kwh.shape[0]
+    n_days = (n + steps_per_day - 1) // steps_per_day
+    for d in range(n_days):
+        # daily bookkeeping happens here, not as a midnight check on every step
+        if month_start[d]:
+            month_exported_kwh = 0.0
+
+        first = d * steps_per_day
+        for i in range(first, min(first + steps_per_day, n)):
+            imported = 0.0
+            exported = 0.0
+            unmet = 0.0
+            charged = 0.0
+            discharged = 0.0
+            curtailed = 0.0
+            blocked = False
+
+            net = net_kwh[i]
+            if net > 0:
+                # Handle surplus energy based on strategy and grid constraints
+                space_kwh = cap - battery_soc
+                remaining_monthly_kwh = max(0.0, monthly_cap_kwh - month_exported_kwh)
+                can_export_to_grid = remaining_monthly_kwh > 0.0
+                blocked = not can_export_to_grid
+
+                if strategy_id == LOAD_PRIORITY or strategy_id == CHARGE_PRIORITY:
+                    # load_priority: charge battery first, then export
+                    # charge_priority: charge battery as much as possible, export only once full
+                    charge_input = min(net, space_kwh * inv_eta_c)
+                    charged = charge_input * eta_c
+                    battery_soc += charged
+
+                    leftover_kwh = net - charge_input
+                    if leftover_kwh > 1e-9 and (strategy_id == LOAD_PRIORITY or battery_soc >= full_kwh):
+                        if can_export_to_grid:
+                            exported = min(leftover_kwh, export_step_kwh, remaining_monthly_kwh)
+                            month_exported_kwh += exported
+                            curtailed = leftover_kwh - exported
+                        else:
+                            # Cannot export - must curtail
+                            curtailed = leftover_kwh
+
+                else:
+                    # produce_priority: export first, then charge battery with leftovers
+                    if can_export_to_grid:
+                        if net > export_step_kwh:
+                            exported = export_step_kwh
+                            remaining = net - export_step_kwh
+                            charge_input = min(remaining, space_kwh * inv_eta_c)
+                            charged = charge_input * eta_c
+                            month_exported_kwh += exported
+
+                            battery_soc += charged
+                            curtailed = remaining - charge_input
+                        else:
+                            exported = net
+                            month_exported_kwh += exported
+                    else:
+                        # Cannot export - charge battery instead
+                        charge_input = min(net, space_kwh * inv_eta_c)
+                        charged = charge_input * eta_c
+                        battery_soc += charged
+                        curtailed = net - charge_input
+            else:
+                need = -net
+                available_kwh = max(0.0, battery_soc - min_soc_kwh)
+                # discharge energy before efficiency loss
+                # to supply energy_load, we need to withdraw discharge = need / efficiency
+                if eta_d > 0:
+                    discharged = min(need / eta_d, available_kwh)
+                    supplied_kwh = discharged * eta_d
+                else:
+                    supplied_kwh = 0.0
+
+                battery_soc -= discharged
+
+                remaining_need_kwh = need - supplied_kwh
+                if remaining_need_kwh > 1e-9:
+                    imported = remaining_need_kwh
+                else:
+                    unmet = remaining_need_kwh
+
+            # clamp battery; builtin min/max on floats compile to branchless maxsd/minsd
+            battery_soc = min(max(0.0, battery_soc), cap)
+
+            soc[i] = battery_soc
+            grid_import_kwh[i] = imported
+            grid_export_kwh[i] = exported
+            unmet_load_kwh[i] = unmet
+            battery_charged_kwh[i] = charged
+            battery_discharged_kwh[i] = discharged
+            curtailed_kwh[i] = curtailed
+            month_exported[i] = month_exported_kwh
+            export_blocked[i] = blocked
+
+    return battery_soc, month_exported_kwh
+
 
 # ---- Model class ---------
 class SimpleGreenGrid:
-    def __init__(self, env, start_soc_frac=0.5, season=None, strategy=None):
-        self.env = env
+    def __init__(self, start_soc_frac=0.5, season=None, strategy=None, rng=None):
+        self.now = 0  # simulation clock, minutes
+        self.rng = rng if rng is not None else np.random.default_rng()
         self.battery_soc = BATTERY_CAP_KWH * start_soc_frac
         self.season = season or getattr(config, "SEASON", "summer")
-        self.cloud_today = sample_cloud_coverage(self.season)
+        self.cloud_today = 0.0
         self.inverter_down_until = -1
         self.strategy = strategy or MANAGEMENT_STRATEGY
+        if self.strategy not in STRATEGY_IDS:
+            raise ValueError(f"Unknown strategy: {self.strategy}")
+        self._strategy_id = STRATEGY_IDS[self.strategy]
         
-        self.log = []
+        self.cols = {}
         self.events = []
 
         self.total_charge_cycles = 0
@@ -79,381 +259,413 @@ class SimpleGreenGrid:
 
         # New: track curtailment
         self.total_curtailed_kwh = 0.0
+        # running sums of log columns, so the summary does not need the full log
+        self.totals = dict.fromkeys(TOTAL_COLUMNS, 0.0)
+        self._prof = dict.fromkeys(PROFILE_SECTIONS, 0)  # ns, only filled when PROFILE
 
         export_mode = f"Limited to {GRID_EXPORT_LIMIT} kW" 
-        self._log_event("SIMULATION START", 
+        self._log_event(0, "SIMULATION START", 
                        f"Strategy: {self.strategy}, Season: {self.season}, Export: {export_mode}")
 
-    def inverter_ok(self):
-        return self.env.now >= self.inverter_down_until
-    
-    def maybe_inverter_failure(self):
-        # call once per day at midnight
-        if random.random() < INVERTER_FAILURE_FREQ:
-            # failure duration sample (hours)
-            dur_h = random.gauss(INVERTER_FAILURE_MIN_H, INVERTER_FAILURE_MIN_H * 0.5)
+    def maybe_inverter_failure(self, now, fail_u, dur_h):
+        # call once per day at midnight; fail_u ~ U(0, 1) and dur_h (hours) are pre-drawn
+        if fail_u < INVERTER_FAILURE_FREQ:
             dur_h = max(4.0, min(72.0, dur_h))
-            self.inverter_down_until = self.env.now + int(dur_h * 60)
-            self._log_event("INVERTER FAILURE", f"Duration: {dur_h:.2f} hours, until minute {self.inverter_down_until}")
+            self.inverter_down_until = now + int(dur_h * 60)
+            self._log_event(now, "INVERTER FAILURE", f"Duration: {dur_h:.2f} hours, until minute {self.inverter_down_until}")
             return True, dur_h
         return False, 0.0
+
+    def _daily_update(self, day_index, cloud, fail_u, fail_dur_h):
+        now = day_index * MINUTES_PER_DAY
+        self.cloud_today = cloud
+        self._log_event(now, "DAILY UPDATE", f"New cloud coverage: {self.cloud_today:.2f}")
+        self.maybe_inverter_failure(now, fail_u, fail_dur_h)
+
+        month_start = day_index > 0 and day_index % MONTH_LENGTH_DAYS == 0
+        if month_start:
+            self.month_index += 1
+            self._log_event(now, "MONTH RESET", f"Month #{self.month_index} export quota reset")
+        return month_start
     
-    def _log_event(self, event_type, description):
+    def _log_event(self, now, event_type, description):
         self.events.append({
-            "time_min": int(self.env.now),
-            "hour": int((self.env.now // 60) % 24),
+            "time_min": int(now),
+            "hour": int((now // 60) % 24),
             "event_type": event_type,
             "description": description
         })
 
-    def _track_battery_cycles(self, is_charging, is_discharging):
-        if is_charging and not self.last_was_charging:
-            self.total_charge_cycles += 1
-            self._log_event("BATTERY CHARGE START", f"Cycle #{self.total_charge_cycles}")
+    def _log_step_events(self, t, ok_before_update, net_kwh, soc, soc_start,
+                         unmet_load_kwh, battery_charged_kwh, battery_discharged_kwh,
+                         curtailed_kwh, export_blocked):
+        """Derive the per-step events from the core's output arrays, in step order."""
+        found = []  # (step index, order within the step, event type, description)
 
-        if is_discharging and not self.last_was_discharging:
-            self.total_discharge_cycles += 1
-            self._log_event("BATTERY DISCHARGE START", f"Cycle #{self.total_discharge_cycles}")
-
-        self.last_was_charging = is_charging
-        self.last_was_discharging = is_discharging
-
-    def _apply_strategy_surplus(self, net_kwh, dt_h):
-        """
-        Handle surplus energy based on strategy and grid constraints.
-        Returns: (grid_export_kwh, battery_charged_kwh, curtailed_kwh)
-        """
-        space_kwh = BATTERY_CAP_KWH - self.battery_soc
-        grid_export_kwh = 0.0
-        battery_charged_kwh = 0.0
-        curtailed_kwh = 0.0
-        
-        # Check if export is allowed
-
-        monthly_cap = GRID_EXPORT_LIMIT
-        remaining_monthly_kwh = max(0.0, monthly_cap - self.month_exported_kwh)
-
-        can_export_to_grid = remaining_monthly_kwh > 0.0
-
-        if self.strategy == "load_priority":
-            # Default: charge battery first, then export
-            charge_input = min(net_kwh, space_kwh / ETA_CHARGE)
-            stored_kwh = charge_input * ETA_CHARGE
-
-            self.battery_soc += stored_kwh
-            battery_charged_kwh = stored_kwh
-
-            leftover_kwh = net_kwh - charge_input
-            if leftover_kwh > 1e-9:
-                if can_export_to_grid:
-                    export_kw_possible = min(leftover_kwh / dt_h if dt_h > 0 else 0.0, GRID_EXPORT_LIMIT)
-                    export_kwh_possible = export_kw_possible * dt_h
-                    export_kwh = min(export_kwh_possible, remaining_monthly_kwh)
-                    grid_export_kwh = export_kwh
-                    self.month_exported_kwh += grid_export_kwh
-                    curtailed_kwh = leftover_kwh - grid_export_kwh
-                else:
-                    # Cannot export - must curtail
-                    curtailed_kwh = leftover_kwh
-                    if curtailed_kwh > 0.01:  # Only log significant curtailment
-                        self._log_event("SOLAR CURTAILMENT", 
-                                      f"Battery full, cannot export: {curtailed_kwh:.4f} kWh wasted")
-
-        elif self.strategy == "charge_priority":
-            # Charge battery as much as possible, then export leftovers
-            charge_input = min(net_kwh, space_kwh / ETA_CHARGE)
-            stored_kwh = charge_input * ETA_CHARGE
-
-            self.battery_soc += stored_kwh
-            battery_charged_kwh = stored_kwh
-
-            leftover_kwh = net_kwh - charge_input
-            if leftover_kwh > 1e-9 and self.battery_soc >= BATTERY_CAP_KWH * 0.99:
-                if can_export_to_grid:
-                    export_kw_possible = min(leftover_kwh / dt_h if dt_h > 0 else 0.0, GRID_EXPORT_LIMIT)
-                    export_kwh_possible = export_kw_possible * dt_h
-                    export_kwh = min(export_kwh_possible, remaining_monthly_kwh)
-                    grid_export_kwh = export_kwh
-                    self.month_exported_kwh += grid_export_kwh
-                    curtailed_kwh = leftover_kwh - grid_export_kwh
-                else:
-                    curtailed_kwh = leftover_kwh
-                    if curtailed_kwh > 0.01:
-                        self._log_event("SOLAR CURTAILMENT", 
-                                      f"Battery full, cannot export: {curtailed_kwh:.4f} kWh wasted")
-        
-        elif self.strategy == "produce_priority":
-            # Export first, then charge battery with leftovers
-            max_export_kwh = GRID_EXPORT_LIMIT * dt_h
-
-            if can_export_to_grid:
-                if net_kwh > max_export_kwh:
-                    grid_export_kwh = max_export_kwh
-                    remaining = net_kwh - max_export_kwh
-                    charge_input = min(remaining, space_kwh / ETA_CHARGE)
-                    stored_kwh = charge_input * ETA_CHARGE
-                    self.month_exported_kwh += grid_export_kwh
-
-                    self.battery_soc += stored_kwh
-                    battery_charged_kwh = stored_kwh
-                    curtailed_kwh = remaining - charge_input
-                else:
-                    grid_export_kwh = net_kwh
-                    self.month_exported_kwh += grid_export_kwh
-            else:
-                # Cannot export - charge battery instead
-                charge_input = min(net_kwh, space_kwh / ETA_CHARGE)
-                stored_kwh = charge_input * ETA_CHARGE
-
-                self.battery_soc += stored_kwh
-                battery_charged_kwh = stored_kwh
-                curtailed_kwh = net_kwh - charge_input
-                if curtailed_kwh > 0.01:
-                    self._log_event("SOLAR CURTAILMENT", 
-                                  f"Cannot export, battery full: {curtailed_kwh:.4f} kWh wasted")
+        was_ok = np.concatenate(([self.prev_inverter_ok], ok_before_update[:-1]))
+        for i in np.flatnonzero(ok_before_update & ~was_ok):
+            found.append((i, 0, "INVERTER RECOVERY", "Inverter is back online"))
+        self.prev_inverter_ok = bool(ok_before_update[-1])
 
+        if self._strategy_id == PRODUCE_PRIORITY:
+            curtail_msg = "Cannot export, battery full"
         else:
-            raise ValueError(f"Unknown strategy: {self.strategy}")
-        
-        return grid_export_kwh, battery_charged_kwh, curtailed_kwh
-            
+            curtail_msg = "Battery full, cannot export"
+        # Only log significant curtailment
+        for i in np.flatnonzero(export_blocked & (curtailed_kwh > 0.01)):
+            found.append((i, 1, "SOLAR CURTAILMENT", f"{curtail_msg}: {curtailed_kwh[i]:.4f} kWh wasted"))
 
-    def step(self, dt_min):
-        """Single timestep energy balance. dt_min in minutes."""
-        dt_h = dt_min / 60.0
-        t = int(self.env.now)
-        hour = int((t // 60) % 24)
+        for i in np.flatnonzero(unmet_load_kwh > 1e-9):
+            found.append((i, 2, "UNMET LOAD", f"{unmet_load_kwh[i]:.4f} kWh unmet"))
 
-        was_ok = self.prev_inverter_ok
-        now_ok = self.inverter_ok()
+        peak_before = np.maximum.accumulate(np.concatenate(([self.peak_battery_soc], soc)))[:-1]
+        for i in np.flatnonzero((soc > peak_before) & (soc >= BATTERY_FULL_KWH)):
+            found.append((i, 3, "BATTERY FULL", f"SoC: {soc[i]:.4f} kWh"))
+        self.peak_battery_soc = max(self.peak_battery_soc, float(soc.max()))
 
-        # daily update at midnight
-        if t % (24 * 60) == 0:
-            self.cloud_today = sample_cloud_coverage(self.season)
-            self._log_event("DAILY UPDATE", f"New cloud coverage: {self.cloud_today:.2f}")
-            self.maybe_inverter_failure()
-
-            day_index = t // (24 * 60)
-            if day_index > 0 and day_index % MONTH_LENGTH_DAYS == 0:
-                self.month_exported_kwh = 0.0
-                self.month_index += 1
-                self._log_event("MONTH RESET", f"Month #{self.month_index} export quota reset")
-
-
-        if (not was_ok) and now_ok:
-            self._log_event("INVERTER RECOVERY", "Inverter is back online")
-
-        # measure
-        solar_kw = solar_generation_kw(int(self.env.now), self.cloud_today, inverter_down=(not self.inverter_ok()))
-        load_kw = sample_load_kw(int(self.env.now))
-
-        usable_solar_kw = min(solar_kw, INVERTER_MAX_KW) if self.inverter_ok() else 0.0
-        energy_gen_kwh = usable_solar_kw * dt_h
-        energy_load_kwh = load_kw * dt_h
-
-        # metrics tracking
-        grid_import_kwh = 0.0
-        grid_export_kwh = 0.0
-        unmet_load_kwh = 0.0
-        battery_charged_kwh = 0.0
-        battery_discharged_kwh = 0.0
-        curtailed_kwh = 0.0
-
-        net_kwh = energy_gen_kwh - energy_load_kwh
-        battery_before = self.battery_soc
-
-        if net_kwh > 0:
-            grid_export_kwh, battery_charged_kwh, curtailed_kwh = self._apply_strategy_surplus(net_kwh, dt_h)
-            self.total_curtailed_kwh += curtailed_kwh
-        else:
-            need = -net_kwh
-            available_kwh = max(0.0, self.battery_soc - BATTERY_CAP_KWH * BATTERY_MIN_SOC_FRAC)
-            # discharge energy before efficiency loss
-            # to supply energy_load, we need to withdraw discharge = need / efficiency
-            if ROUND_TRIP > 0:
-                discharge_needed_kwh = min(need / ETA_DISCHARGE, available_kwh)
-                supplied_kwh = discharge_needed_kwh * ETA_DISCHARGE
-
-            else:
-                discharge_needed_kwh = 0.0
-                supplied_kwh = 0.0
-            
-            self.battery_soc -= discharge_needed_kwh
-            battery_discharged_kwh = discharge_needed_kwh
-
-            
-            remaining_need_kwh = need - supplied_kwh
-            unmet_load_kwh = remaining_need_kwh - grid_import_kwh
-
-            if remaining_need_kwh > 1e-9:
-                grid_import_kwh = remaining_need_kwh
-                unmet_load_kwh = 0.0
-
-            if unmet_load_kwh > 1e-9:
-                self._log_event("UNMET LOAD", f"{unmet_load_kwh:.4f} kWh unmet")
-
-        
-        # Limits and validations
-        # clamp battery
-        self.battery_soc = min(max(0.0, self.battery_soc), BATTERY_CAP_KWH)
-
-        if self.battery_soc > self.peak_battery_soc:
-            self.peak_battery_soc = self.battery_soc
-            if self.battery_soc >= BATTERY_CAP_KWH * 0.99:
-                self._log_event("BATTERY FULL", f"SoC: {self.battery_soc:.4f} kWh")
-
-        if self.battery_soc < self.min_battery_soc:
-            self.min_battery_soc = self.battery_soc
-            if self.battery_soc <= BATTERY_CAP_KWH * BATTERY_MIN_SOC_FRAC * 1.01:
-                self._log_event("BATTERY LOW", f"SoC: {self.battery_soc:.4f} kWh")
+        min_before = np.minimum.accumulate(np.concatenate(([self.min_battery_soc], soc)))[:-1]
+        for i in np.flatnonzero((soc < min_before) & (soc <= BATTERY_LOW_KWH)):
+            found.append((i, 4, "BATTERY LOW", f"SoC: {soc[i]:.4f} kWh"))
+        self.min_battery_soc = min(self.min_battery_soc, float(soc.min()))
 
+        # battery cycles
         is_charging = battery_charged_kwh > 1e-9
+        charge_start = is_charging & ~np.concatenate(([self.last_was_charging], is_charging[:-1]))
+        for n, i in enumerate(np.flatnonzero(charge_start), start=self.total_charge_cycles + 1):
+            found.append((i, 5, "BATTERY CHARGE START", f"Cycle #{n}"))
+        self.total_charge_cycles += int(charge_start.sum())
+        self.last_was_charging = bool(is_charging[-1])
+
         is_discharging = battery_discharged_kwh > 1e-9
-        self._track_battery_cycles(is_charging, is_discharging)
+        discharge_start = is_discharging & ~np.concatenate(([self.last_was_discharging], is_discharging[:-1]))
+        for n, i in enumerate(np.flatnonzero(discharge_start), start=self.total_discharge_cycles + 1):
+            found.append((i, 6, "BATTERY DISCHARGE START", f"Cycle #{n}"))
+        self.total_discharge_cycles += int(discharge_start.sum())
+        self.last_was_discharging = bool(is_discharging[-1])
 
         # If net was negative (we should discharge) but SoC increased, flag it
-        if net_kwh < -1e-9 and self.battery_soc > battery_before + 1e-6:
-            self._log_event("WARNING", f"SoC increased during deficit. net={net_kwh:.6f}, before={battery_before:.6f}, after={self.battery_soc:.6f}")
-        self.prev_inverter_ok = now_ok
+        soc_before = np.concatenate(([soc_start], soc[:-1]))
+        for i in np.flatnonzero((net_kwh < -1e-9) & (soc > soc_before + 1e-6)):
+            found.append((i, 7, "WARNING", f"SoC increased during deficit. net={net_kwh[i]:.6f}, before={soc_before[i]:.6f}, after={soc[i]:.6f}"))
 
-        import_cost = grid_import_kwh * IMPORT_COST
-        export_revenue = grid_export_kwh * EXPORT_COST
-        net_cost = import_cost - export_revenue
+        found.sort(key=lambda e: (e[0], e[1]))
+        for i, _, event_type, description in found:
+            self._log_event(t[i], event_type, description)
 
-
-        
-        self.log.append({
-            "time_min": int(self.env.now),
-            "hour": hour,
-            "solar_kw": round(solar_kw, 4),
-            "load_kw": round(load_kw, 4),
-            "energy_gen_kwh": round(energy_gen_kwh, 6),
-            "energy_load_kwh": round(energy_load_kwh, 6),
-            "net_kwh": round(net_kwh, 6),
-            "battery_soc_kwh": round(self.battery_soc, 6),
-            "battery_soc_pct": round(self.battery_soc / BATTERY_CAP_KWH * 100, 2),
-            "battery_charged_kwh": round(battery_charged_kwh, 6),
-            "battery_discharged_kwh": round(battery_discharged_kwh, 6),
-            "grid_import_kwh": round(grid_import_kwh, 6),
-            "grid_export_kwh": round(grid_export_kwh, 6),
-            "curtailed_kwh": round(curtailed_kwh, 6), 
-            "unmet_load_kwh": round(unmet_load_kwh, 6),
-            "inverter_ok": self.inverter_ok(),
-            "cloud": round(self.cloud_today, 4),
-            "strategy": self.strategy,
-            "import_cost": round(import_cost, 6),
-            "export_revenue": round(export_revenue, 6),
-            "net_cost": round(net_cost, 6),
-            "month_exported_kwh": round(self.month_exported_kwh, 6)
-        })
-
-    def run(self, dt_min, total_min):
+    def run(self, dt_min, total_min, log_writer=None, events_writer=None):
+        """
+        Vectorized energy balance, processed in blocks of LOG_CHUNK_DAYS days. dt_min in minutes.
+        With writers, each block's log and events are written and dropped, so memory
+        does not grow with the horizon; otherwise self.cols holds the last block.
+        """
+        if MINUTES_PER_DAY % dt_min:
+            raise ValueError(f"Timestep must divide a day evenly: {dt_min} min")
         steps = int(total_min // dt_min)
-        for _ in range(steps):
-            self.step(dt_min)
-            yield self.env.timeout(dt_min)
+        block_steps = LOG_CHUNK_DAYS * (MINUTES_PER_DAY // dt_min)
 
-        self._log_event("SIMULATION END", 
+        for first in range(0, steps, block_steps):
+            self._run_block(min(block_steps, steps - first), dt_min)
+            t0 = self._lap(None, 0)
+            if log_writer is not None:
+                log_writer.write(self.cols)
+            self._flush_events(events_writer)
+            self._lap("write", t0)
+
+        self._log_event(self.now, "SIMULATION END", 
                         f"Total charge cycles: {self.total_charge_cycles}, "
                         f"Total discharge cycles: {self.total_discharge_cycles}, "
                         f"Peak SoC: {self.peak_battery_soc:.4f} kWh, "
                         f"Min SoC: {self.min_battery_soc:.4f} kWh, "
                         f"Total curtailed: {self.total_curtailed_kwh:.4f} kWh")
+        self._flush_events(events_writer)
+
+    def _lap(self, section, t0):
+        """Profiling: add the time since t0 to `section` and return the new start time."""
+        if not PROFILE:
+            return 0
+        now = time.perf_counter_ns()
+        if section is not None:
+            self._prof[section] += now - t0
+        return now
+
+    def _flush_events(self, events_writer):
+        # daily events were drawn up front; restore chronological order
+        self.events.sort(key=lambda e: e["time_min"])
+        if events_writer is not None and self.events:
+            events_writer.write({k: [e[k] for e in self.events] for k in EVENT_FIELDS})
+            self.events = []
+
+    def _run_block(self, steps, dt_min):
+        """Simulate `steps` timesteps starting at self.now (a midnight)."""
+        dt_h = dt_min / 60.0
+        steps_per_day = MINUTES_PER_DAY // dt_min
+        first_day = self.now // MINUTES_PER_DAY
+        n_days = -(-steps // steps_per_day)
+        t0 = self._lap(None, 0)
+
+        # time axis
+        t = self.now + np.arange(steps, dtype=np.int64) * dt_min
+
+        # all randoms for the block, drawn up front in batches
+        rng = self.rng
+        spike_mask = rng.random(steps) < 0.05
+        spike_amp = rng.uniform(0.0, PEAK_LOAD, steps)
+        noise = rng.uniform(-0.1, 0.2, steps)
+        inv_fail_u = rng.random(n_days)
+        inv_dur_h = rng.normal(INVERTER_FAILURE_MIN_H, INVERTER_FAILURE_MIN_H * 0.5, n_days)
+        cloud_by_day = sample_cloud_coverage_array(self.season, n_days, rng)
+        t0 = self._lap("rng", t0)
+
+        # daily update at midnight: cloud coverage, inverter failures, month reset
+        prev_down_until = np.empty(n_days, dtype=np.int64)
+        down_until_by_day = np.empty(n_days, dtype=np.int64)
+        month_start = np.empty(n_days, dtype=np.bool_)
+        for d in range(n_days):
+            prev_down_until[d] = self.inverter_down_until
+            month_start[d] = self._daily_update(first_day + d, cloud_by_day[d], inv_fail_u[d], inv_dur_h[d])
+            down_until_by_day[d] = self.inverter_down_until
+
+        # inverter state after the midnight draw, and as seen before it (for recovery events)
+        inv_ok = t >= np.repeat(down_until_by_day, steps_per_day)[:steps]
+        ok_before_update = inv_ok.copy()
+        ok_before_update[::steps_per_day] = t[::steps_per_day] >= prev_down_until
+
+        # preallocated log columns, filled by index
+        cols = self.cols = {name: np.empty(steps, dtype=dtype) for name, dtype in LOG_COLUMNS.items()}
+        cols["time_min"][:] = t
+        cols["hour"][:] = (t // 60) % 24
+        cols["inverter_ok"][:] = inv_ok
+        cols["strategy"][:] = self.strategy
+        t0 = self._lap("daily", t0)
+
+        # measure
+        cloud = cols["cloud"]
+        cloud[:] = np.repeat(cloud_by_day, steps_per_day)[:steps]
+        solar_kw = cols["solar_kw"]
+        solar_kw[:] = solar_generation_kw_vec(t, cloud, inv_ok)
+        t0 = self._lap("solar", t0)
+        load_kw = cols["load_kw"]
+        load_kw[:] = sample_load_kw(t, spike_mask, spike_amp, noise)
+        t0 = self._lap("load", t0)
+
+        # solar_kw is already zero while the inverter is down
+        np.minimum(solar_kw, INVERTER_MAX_KW, out=cols["energy_gen_kwh"])
+        cols["energy_gen_kwh"] *= dt_h
+        np.multiply(load_kw, dt_h, out=cols["energy_load_kwh"])
+        net_kwh = np.subtract(cols["energy_gen_kwh"], cols["energy_load_kwh"], out=cols["net_kwh"])
+
+        # battery SoC is a serial recurrence: run it once per block, compiled
+        export_blocked = np.empty(steps, dtype=np.bool_)
+        soc_start = self.battery_soc
+        self.battery_soc, self.month_exported_kwh = _simulate_core(
+            net_kwh, steps_per_day, month_start, BATTERY_CAP_KWH, BATTERY_FULL_KWH,
+            BATTERY_MIN_SOC_KWH, ETA_CHARGE, INV_ETA_CHARGE, ETA_DISCHARGE,
+            GRID_EXPORT_LIMIT * dt_h, GRID_EXPORT_LIMIT,
+            self._strategy_id, self.battery_soc, self.month_exported_kwh,
+            cols["battery_soc_kwh"], cols["grid_import_kwh"], cols["grid_export_kwh"],
+            cols["unmet_load_kwh"], cols["battery_charged_kwh"], cols["battery_discharged_kwh"],
+            cols["curtailed_kwh"], cols["month_exported_kwh"], export_blocked)
+        soc = cols["battery_soc_kwh"]
+        t0 = self._lap("core", t0)
+
+        self._log_step_events(t, ok_before_update, net_kwh, soc, soc_start,
+                              cols["unmet_load_kwh"], cols["battery_charged_kwh"],
+                              cols["battery_discharged_kwh"], cols["curtailed_kwh"], export_blocked)
+        t0 = self._lap("events", t0)
+        self.total_curtailed_kwh += float(cols["curtailed_kwh"].sum(dtype=np.float64))
+
+        np.divide(soc, BATTERY_CAP_KWH, out=cols["battery_soc_pct"])
+        cols["battery_soc_pct"] *= 100
+        np.multiply(cols["grid_import_kwh"], IMPORT_COST, out=cols["import_cost"])
+        np.multiply(cols["grid_export_kwh"], EXPORT_COST, out=cols["export_revenue"])
+        np.subtract(cols["import_cost"], cols["export_revenue"], out=cols["net_cost"])
+
+        for name in self.totals:
+            self.totals[name] += float(cols[name].sum(dtype=np.float64))
+        self._lap("columns", t0)
+
+        self.now += steps * dt_min
 
 # ---- RUN HELPER ----
-def run_simulation(days=None):
+class TableWriter:
+    """Append blocks of equal-length columns to one Parquet (zstd) or CSV file."""
+
+    def __init__(self, path, output_format):
+        if output_format not in ("parquet", "csv"):
+            raise ValueError(f"Unknown output format: {output_format}")
+        self.path = path
+        self.output_format = output_format
+        self.rows = 0
+        self._parquet = None
+
+    def write(self, columns):
+        if self.output_format == "csv":
+            pd.DataFrame(columns).to_csv(self.path, mode="a" if self.rows else "w", header=not self.rows,
+                                         index=False, float_format="%.6f")
+        else:
+            table = pa.table({name: pa.array(col) for name, col in columns.items()})
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+            self._parquet.write_table(table)
+        self.rows += len(next(iter(columns.values())))
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_simulation(days=None, strategy=None, season=None, seed=None,
+                   log_path=None, events_path=None, output_format=None, verbose=True):
+    """
+    Run one simulation and save its log/events as Parquet (default) or CSV.
+    Returns a dict of summary totals for the run.
+    """
     dt = TIMESTEP_MIN
-    
-    if SIM_TOTAL_DAY is not None:
-        total_min = SIM_TOTAL_DAY * 24 * 60
-        print(f"Simulating {SIM_TOTAL_DAY} day(s) = {total_min} minutes")
-    elif days is not None:
-        total_min = days * 24 * 60
+    days = days if days is not None else SIM_TOTAL_DAY
+    total_min = days * 24 * 60
+    strat = strategy or MANAGEMENT_STRATEGY or "load_priority"
+    season = season or getattr(config, "SEASON", "summer")
+    output_format = output_format or OUTPUT_FORMAT
+    log_path = log_path or os.path.join(OUTPUT_DIR, f"log.{output_format}")
+    events_path = events_path or os.path.join(OUTPUT_DIR, f"events.{output_format}")
+
+    if verbose:
         print(f"Simulating {days} day(s) = {total_min} minutes")
-    
-    strat = MANAGEMENT_STRATEGY or "load_priority"
-    print(f"Strategy: {strat}")
-    print(f"Timestep: {dt} minutes")
-    print(f"Total timesteps: {total_min // dt}")
-    print(f"Battery capacity: {BATTERY_CAP_KWH} kWh")
-    print(f"Round-trip efficiency: {ROUND_TRIP*100}%")
-    print(f"Season: {getattr(config, 'SEASON', 'summer')}")
-    print(f"Export mode: {GRID_EXPORT_LIMIT} kW limit")
-    print("-" * 70)
-
-    env = simpy.Environment()
-    plant = SimpleGreenGrid(env, start_soc_frac=0.5, strategy=strat)
-    env.process(plant.run(dt, total_min))
-    env.run()
-
-    # save log to CSV
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    with open(OUTPUT_CSV, "w", newline="") as f:
-        fieldnames = list(plant.log[0].keys())
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in plant.log:
-            writer.writerow(r)
-
-    with open(EVENTS_CSV, "w", newline="") as f:
-        if plant.events:
-            fieldnames = list(plant.events[0].keys())
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for e in plant.events:
-                writer.writerow(e)
+        print(f"Strategy: {strat}")
+        print(f"Timestep: {dt} minutes")
+        print(f"Total timesteps: {total_min // dt}")
+        print(f"Battery capacity: {BATTERY_CAP_KWH} kWh")
+        print(f"Round-trip efficiency: {ROUND_TRIP*100}%")
+        print(f"Season: {season}")
+        print(f"Export mode: {GRID_EXPORT_LIMIT} kW limit")
+        print("-" * 70)
+
+    rng = np.random.default_rng(seed)
+    plant = SimpleGreenGrid(start_soc_frac=0.5, season=season, strategy=strat, rng=rng)
+
+    # log and events are streamed to disk block by block
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    with TableWriter(log_path, output_format) as log_writer, \
+         TableWriter(events_path, output_format) as events_writer:
+        plant.run(dt, total_min, log_writer, events_writer)
 
     # ========== CALCULATE MONTHLY TOTALS ==========
-    total_solar_gen = sum(r['energy_gen_kwh'] for r in plant.log)
-    total_load = sum(r['energy_load_kwh'] for r in plant.log)
-    total_import = sum(r['grid_import_kwh'] for r in plant.log)
-    total_export = sum(r['grid_export_kwh'] for r in plant.log)
-    total_curtailed = sum(r['curtailed_kwh'] for r in plant.log)
-    total_import_cost = sum(r['import_cost'] for r in plant.log)
-    total_export_revenue = sum(r['export_revenue'] for r in plant.log)
-    net_balance = total_export_revenue - total_import_cost
-    
+    total_solar_gen = plant.totals['energy_gen_kwh']
+    total_load = plant.totals['energy_load_kwh']
+    total_import = plant.totals['grid_import_kwh']
+    total_export = plant.totals['grid_export_kwh']
+    total_import_cost = plant.totals['import_cost']
+    total_export_revenue = plant.totals['export_revenue']
+
     # Calculate performance indicators
     solar_used = total_solar_gen - total_export
-    self_sufficiency_pct = (solar_used / total_load * 100) if total_load > 0 else 0
-    grid_dependency_pct = (total_import / total_load * 100) if total_load > 0 else 0
 
-    print(f"Simulation completed")
-    print(f"Main log: {OUTPUT_CSV} ({len(plant.log)} records)")
-    print(f"Events: {EVENTS_CSV} ({len(plant.events)} events)")
-    print("-" * 70)
+    summary = {
+        "days": days,
+        "strategy": strat,
+        "season": season,
+        "total_solar_gen_kwh": total_solar_gen,
+        "total_load_kwh": total_load,
+        "total_import_kwh": total_import,
+        "total_export_kwh": total_export,
+        "total_curtailed_kwh": plant.totals['curtailed_kwh'],
+        "import_cost": total_import_cost,
+        "export_revenue": total_export_revenue,
+        "net_balance": total_export_revenue - total_import_cost,
+        "self_sufficiency_pct": (solar_used / total_load * 100) if total_load > 0 else 0,
+        "grid_dependency_pct": (total_import / total_load * 100) if total_load > 0 else 0,
+        "solar_utilization_pct": (solar_used / total_solar_gen * 100) if total_solar_gen > 0 else 0,
+        "charge_cycles": plant.total_charge_cycles,
+        "discharge_cycles": plant.total_discharge_cycles,
+        "peak_soc_kwh": plant.peak_battery_soc,
+        "min_soc_kwh": plant.min_battery_soc,
+    }
+
+    if verbose:
+        print(f"Simulation completed")
+        print(f"Main log: {log_path} ({log_writer.rows} records)")
+        print(f"Events: {events_path} ({events_writer.rows} events)")
+        print("-" * 70)
+        print_summary(summary)
+        print("\n" + "=" * 70)
+        print(f"Files saved: {log_path}, {events_path}")
+        print("=" * 70)
+        if PROFILE:
+            print_profile(plant._prof)
+
+    return summary
+
+
+def print_summary(s):
+    net_balance = s["net_balance"]
     
-    print(f"\nENERGY SUMMARY ({SIM_TOTAL_DAY} days):")
+    print(f"\nENERGY SUMMARY ({s['days']} days):")
     print("=" * 70)
-    print(f"Total solar generated:        {total_solar_gen:>10.2f} kWh")
-    print(f"Total consumed:               {total_load:>10.2f} kWh")
-    print(f"Total grid import:            {total_import:>10.2f} kWh")
-    print(f"Total grid export:            {total_export:>10.2f} kWh")
-    print(f"Total curtailed (wasted):     {total_curtailed:>10.2f} kWh ({total_curtailed/total_solar_gen*100:.1f}% of generation)")
+    print(f"Total solar generated:        {s['total_solar_gen_kwh']:>10.2f} kWh")
+    print(f"Total consumed:               {s['total_load_kwh']:>10.2f} kWh")
+    print(f"Total grid import:            {s['total_import_kwh']:>10.2f} kWh")
+    print(f"Total grid export:            {s['total_export_kwh']:>10.2f} kWh")
+    print(f"Total curtailed (wasted):     {s['total_curtailed_kwh']:>10.2f} kWh ({s['total_curtailed_kwh']/s['total_solar_gen_kwh']*100:.1f}% of generation)")
     
     print(f"\nECONOMIC BALANCE:")
     print("=" * 70)
-    print(f"Cost of imported energy:      ${total_import_cost:>10.4f}")
-    print(f"Revenue from exported energy: ${total_export_revenue:>10.4f}")
+    print(f"Cost of imported energy:      ${s['import_cost']:>10.4f}")
+    print(f"Revenue from exported energy: ${s['export_revenue']:>10.4f}")
     print(f"Net balance:                  ${net_balance:>10.4f} {'(Loss)' if net_balance < 0 else '(Profit)'}")
     
     print(f"\nPERFORMANCE INDICATORS:")
     print("=" * 70)
-    print(f"Self-sufficiency:             {self_sufficiency_pct:>10.1f}%")
-    print(f"Grid dependency:              {grid_dependency_pct:>10.1f}%")
-    print(f"Solar utilization efficiency: {(solar_used/total_solar_gen*100) if total_solar_gen > 0 else 0:>10.1f}%")
+    print(f"Self-sufficiency:             {s['self_sufficiency_pct']:>10.1f}%")
+    print(f"Grid dependency:              {s['grid_dependency_pct']:>10.1f}%")
+    print(f"Solar utilization efficiency: {s['solar_utilization_pct']:>10.1f}%")
     
     print(f"\nBATTERY:")
     print("=" * 70)
-    print(f"Charge cycles:                {plant.total_charge_cycles:>10}")
-    print(f"Discharge cycles:             {plant.total_discharge_cycles:>10}")
-    print(f"Peak SoC:                     {plant.peak_battery_soc:>10.4f} kWh ({plant.peak_battery_soc/BATTERY_CAP_KWH*100:.1f}%)")
-    print(f"Minimum SoC:                  {plant.min_battery_soc:>10.4f} kWh ({plant.min_battery_soc/BATTERY_CAP_KWH*100:.1f}%)")
-    
-    print("\n" + "=" * 70)
-    print(f"Files saved: {OUTPUT_CSV}, {EVENTS_CSV}")
+    print(f"Charge cycles:                {s['charge_cycles']:>10}")
+    print(f"Discharge cycles:             {s['discharge_cycles']:>10}")
+    print(f"Peak SoC:                     {s['peak_soc_kwh']:>10.4f} kWh ({s['peak_soc_kwh']/BATTERY_CAP_KWH*100:.1f}%)")
+    print(f"Minimum SoC:                  {s['min_soc_kwh']:>10.4f} kWh ({s['min_soc_kwh']/BATTERY_CAP_KWH*100:.1f}%)")
+
+
+def print_profile(prof):
+    total = sum(prof.values()) or 1
+
+    print(f"\nPROFILE (first run includes Numba compile/cache load in 'core'):")
     print("=" * 70)
+    for name, ns in sorted(prof.items(), key=lambda kv: -kv[1]):
+        print(f"{name + ':':<30}{ns / 1e6:>10.2f} ms ({ns / total * 100:.1f}%)")
+
+
+# ---- PARAMETER SWEEPS ----
+def _run_one(args):
+    i, params, seed = args
+    params = dict(params)
+    ext = params.get("output_format") or OUTPUT_FORMAT
+    params.setdefault("log_path", os.path.join(OUTPUT_DIR, f"run_{i}.{ext}"))
+    params.setdefault("events_path", os.path.join(OUTPUT_DIR, f"run_{i}_events.{ext}"))
+    return run_simulation(seed=seed, verbose=False, **params)
+
+
+def run_many(param_list, seed=None, max_workers=None):
+    """
+    Run independent simulations in parallel, one per process.
+    param_list: list of dicts of run_simulation keyword arguments
+                (days, strategy, season, ...). Run i writes output/run_{i}.parquet (or .csv).
+    seed: base seed; every run gets its own child seed, so sweeps are reproducible.
+    Returns a DataFrame with one summary row per run.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(param_list))
+    jobs = [(i, params, s) for i, (params, s) in enumerate(zip(param_list, seeds))]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        summaries = list(pool.map(_run_one, jobs))
+    return pd.DataFrame(summaries)
 
 
 if __name__ == "__main__":
-    run_simulation()
\ No newline at end of file
+    run_simulation()
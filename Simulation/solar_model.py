@@ -1,5 +1,5 @@
-import random
 import math
+import numpy as np
 from Configs import config1 as config
 
 
@@ -10,28 +10,45 @@ SEASON_WEIGHTS = {
     "winter": (0.3, 0.4, 0.2, 0.1),
 }
 
-def sample_cloud_coverage(season: str) -> float:
+# Probabilidades y pesos acumulados (normalizados) por estación, y límites de cada
+# bucket de nubes: Clear, Partly Cloudy, Mostly Cloudy, Overcast.
+_SEASON_PROBS = {season: np.array(w) / sum(w) for season, w in SEASON_WEIGHTS.items()}
+_SEASON_CUM = {season: np.cumsum(p) for season, p in _SEASON_PROBS.items()}
+for _cum in _SEASON_CUM.values():
+    _cum[-1] = 1.0
+_LO = np.array([0.0, 0.2, 0.6, 0.8])
+_HI = np.array([0.2, 0.6, 0.8, 0.9])
+
+def _season_cum(season: str) -> np.ndarray:
+    return _SEASON_CUM.get(season.lower(), _SEASON_CUM["spring"])
+
+# Generador por defecto cuando no se pasa rng.
+_DEFAULT_RNG = np.random.default_rng()
+
+MINUTES_PER_DAY = 24 * 60
+
+# Forma diaria max(0, sin) precalculada por minuto del día (día despejado, 0-1).
+_SHAPE = np.maximum(0.0, np.sin((np.arange(MINUTES_PER_DAY) / 60.0 - 6.0) * (math.pi / 12.0)))
+
+def sample_cloud_coverage(season: str, rng: np.random.Generator = None) -> float:
     """
     Regresa un número 0-1.
     Ej: 0.3 significa 30% menos generación.
+    Usa rng (np.random.Generator) si se pasa; si no, un generador del módulo.
     """
-    w = SEASON_WEIGHTS.get(season.lower(), SEASON_WEIGHTS["spring"])
-
-    buckets = [
-        ((0.0, 0.2), w[0]),  # Clear
-        ((0.2, 0.6), w[1]),  # Partly Cloudy
-        ((0.6, 0.8), w[2]),  # Mostly Cloudy
-        ((0.8, 0.9), w[3]),  # Overcast
-    ]
-
-    r = random.random() * sum(w)
-    acc = 0.0
-    for (lo, hi), weight in buckets:
-        acc += weight
-        if r <= acc:
-            return random.uniform(lo, hi)
+    rng = rng if rng is not None else _DEFAULT_RNG
+    probs = _SEASON_PROBS.get(season.lower(), _SEASON_PROBS["spring"])
+    idx = rng.choice(4, p=probs)
+    return float(rng.uniform(_LO[idx], _HI[idx]))
 
-    return random.uniform(0.0, 0.2)
+def sample_cloud_coverage_array(season: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Versión vectorizada de sample_cloud_coverage: n días de una sola vez.
+    Regresa un arreglo de números 0-1.
+    (Equivale a rng.choice(4, size=n, p=probs), pero reutiliza los acumulados ya calculados.)
+    """
+    idx = np.searchsorted(_season_cum(season), rng.random(n))
+    return rng.uniform(_LO[idx], _HI[idx])
 
 def solar_generation_kw(env_now_min: int, cloud_coverage: float, inverter_down: bool = False) -> float:
     """
@@ -41,12 +58,17 @@ def solar_generation_kw(env_now_min: int, cloud_coverage: float, inverter_down:
     if inverter_down:
         return 0.0
 
-    t_hours = (env_now_min % (24*60)) / 60.0
-    sun_angle = (t_hours - 6.0) * (math.pi / 12.0)
-
-    ideal = config.SOLAR_PANEL_CAPACITY * max(0.0, math.sin(sun_angle))
-
+    ideal = config.SOLAR_PANEL_CAPACITY * _SHAPE[int(env_now_min) % MINUTES_PER_DAY]
 
     actual = ideal * (1.0 - cloud_coverage)
 
-    return min(actual, float(config.MAX_INVERTER_OUTPUT))
+    return min(float(actual), float(config.MAX_INVERTER_OUTPUT))
+
+def solar_generation_kw_vec(t_array: np.ndarray, cloud_array: np.ndarray, inverter_ok: np.ndarray) -> np.ndarray:
+    """
+    Versión vectorizada de solar_generation_kw para todo el horizonte.
+    t_array en minutos; devuelve un arreglo de kW (0 donde el inversor está caído).
+    """
+    ideal = config.SOLAR_PANEL_CAPACITY * _SHAPE[t_array % MINUTES_PER_DAY]
+    actual = np.minimum(ideal * (1.0 - cloud_array), float(config.MAX_INVERTER_OUTPUT))
+    return np.where(inverter_ok, actual, 0.0)